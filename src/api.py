@@ -0,0 +1,263 @@
+"""
+api.py
+------
+Embeddable Python API for PortHoundX.
+
+Runs checks in-process instead of spawning `porthoundx.py` and parsing its
+output. `scan_many` yields typed `ScanResult`s as probes complete; the async
+variant `ascan_many` does the same for asyncio code.
+
+Usage (example):
+    from api import CancelToken, scan_many
+
+    token = CancelToken()
+    for result in scan_many(["10.0.0.0/28", "example.com"], [22, 443], cancel=token):
+        if result.open:
+            print(result.host, result.port, result.rtt_ms)
+
+    # callback style
+    for _ in scan_many(targets, ports, callback=print):
+        pass
+"""
+
+import asyncio
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import utils
+from planner import ProbePlan, TargetSet, collapse_aliases
+
+
+class ScanResult(NamedTuple):
+    """
+    Outcome of one (host, port) probe.
+
+    `status` is "open", "closed" or "resource_exhausted"; the last means the
+    scanning host ran out of fds/ephemeral ports and the target is unknown.
+    `aliases` lists other requested hostnames that shared this probe.
+    """
+
+    host: str
+    ip: str
+    port: int
+    open: bool
+    status: str
+    rtt_ms: Optional[float]
+    service: Optional[str]
+    is_private: bool
+    reachable: bool
+    cloud_provider: str
+    dual_stack: Optional[Dict] = None
+    aliases: Tuple[str, ...] = ()
+
+
+class CancelToken:
+    """Thread-safe flag to stop a running `scan_many` from any thread."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class _HostHeaders:
+    """Resolve/ping/cloud-detect each host once, however many ports probe it concurrently."""
+
+    def __init__(self, dual_stack: bool = False):
+        self.dual_stack = dual_stack
+        self._lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._headers: Dict[str, Dict] = {}
+
+    def get(self, host: str) -> Dict:
+        header = self._headers.get(host)
+        if header is not None:
+            return header
+        with self._lock:
+            host_lock = self._locks.setdefault(host, threading.Lock())
+        with host_lock:
+            if host not in self._headers:
+                self._headers[host] = utils.host_header(host, self.dual_stack)
+        return self._headers[host]
+
+
+def _probe(headers, host, port, detect_services, dual_stack, timeout, sources) -> ScanResult:
+    header = headers.get(host)
+    status, rtt, race = utils.probe_port(
+        host, header["ip"], port, dual_stack, timeout, sources, header.get("addresses")
+    )
+    is_open = status is True
+    if utils.is_resource_exhausted(status):
+        label = "resource_exhausted"
+    else:
+        label = "open" if is_open else "closed"
+    return ScanResult(
+        host=host,
+        ip=header["ip"],
+        port=port,
+        open=is_open,
+        status=label,
+        rtt_ms=rtt,
+        service=utils.detect_service(header["ip"], port) if detect_services and is_open else None,
+        is_private=header["is_private"],
+        reachable=header["reachable"],
+        cloud_provider=header["cloud_provider"],
+        dual_stack=race,
+    )
+
+
+def _fan_out(result: ScanResult, aliases: Dict[str, List[str]], probe_set: Set[str]) -> Iterator[ScanResult]:
+    """Yield `result` once per requested target it stands for."""
+    names = aliases.get(result.host)
+    if names is None or result.host not in probe_set:
+        yield result  # CIDR member (possibly also named by a hostname below)
+    for name in names or ():
+        yield result._replace(host=name, aliases=tuple(n for n in names if n != name))
+
+
+def scan_many(
+    targets: Sequence[str],
+    ports: Sequence[int],
+    detect_services: bool = False,
+    randomize: bool = False,
+    prioritize: bool = False,
+    seed: Optional[int] = None,
+    dual_stack: bool = False,
+    timeout: float = 1.0,
+    workers: Optional[int] = None,
+    sources: Optional[Sequence[str]] = None,
+    retries: int = 2,
+    dedupe: bool = True,
+    callback: Optional[Callable[[ScanResult], None]] = None,
+    cancel: Optional[CancelToken] = None,
+) -> Iterator[ScanResult]:
+    """
+    Probe every (target, port) and yield results in completion order.
+
+    Parameters
+    ----------
+    targets : Sequence[str]
+        Hosts, IPs or CIDR blocks; CIDRs are walked lazily.
+    ports : Sequence[int]
+        Ports to probe on every target.
+    detect_services, randomize, prioritize, seed, dual_stack :
+        Same meaning as for `PortHoundXDiagnostics`.
+    timeout : float
+        Per-connect timeout in seconds.
+    workers : Optional[int]
+        Maximum concurrent probes. Defaults to what the fd limit and the
+        ephemeral port range allow (`utils.max_concurrency`). Only this many
+        probes are queued at once, so the target space is never materialized.
+    sources : Optional[Sequence[str]]
+        Local source addresses to rotate probes across.
+    retries : int
+        Times a probe that hit local resource exhaustion is retried. Each hit
+        halves the concurrency, which then grows back by one per window of
+        successful probes; a probe still exhausted after its retries is
+        yielded with status "resource_exhausted".
+    dedupe : bool
+        Resolve hostnames first and probe each distinct address once; the
+        result is yielded for every hostname that maps to it.
+    callback : Optional[Callable[[ScanResult], None]]
+        Called with each result (in the consuming thread) before it is yielded.
+    cancel : Optional[CancelToken]
+        Stops the scan once cancelled; queued and unyielded results are dropped.
+    """
+    if dedupe:
+        probe_specs, aliases = collapse_aliases(targets, dual_stack=dual_stack)
+    else:
+        probe_specs, aliases = list(targets), {}
+    probe_set = set(probe_specs)
+    plan = ProbePlan(TargetSet(probe_specs), ports, seed=seed, randomize=randomize, prioritize=prioritize)
+    probes = iter(plan)
+    headers = _HostHeaders(dual_stack)
+    pool = utils.SourcePool(sources) if sources else None
+    if workers is None:
+        workers = utils.max_concurrency(n_sources=len(pool) if pool else 1, per_probe=2 if dual_stack else 1)
+    cancel = cancel or CancelToken()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    in_flight: Dict = {}
+    limit = float(workers)
+    exhausted = False
+
+    def submit(host, port, tries):
+        future = executor.submit(_probe, headers, host, port, detect_services, dual_stack, timeout, pool)
+        in_flight[future] = (host, port, tries)
+
+    try:
+        while not cancel.cancelled:
+            while not exhausted and len(in_flight) < int(limit):
+                try:
+                    host, port = next(probes)
+                except StopIteration:
+                    exhausted = True
+                    break
+                submit(host, port, 0)
+            if not in_flight:
+                break
+            # Short wait so a cancel from another thread is noticed promptly.
+            done, _ = wait(in_flight, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                if cancel.cancelled:
+                    break
+                host, port, tries = in_flight.pop(future)
+                result = future.result()
+                if result.status == "resource_exhausted":
+                    limit = max(1.0, limit / 2)
+                    if tries < retries:
+                        submit(host, port, tries + 1)
+                        continue
+                else:
+                    limit = min(float(workers), limit + 1 / limit)
+                for item in _fan_out(result, aliases, probe_set):
+                    if callback is not None:
+                        callback(item)
+                    yield item
+    finally:
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+async def ascan_many(*args, **kwargs) -> AsyncIterator[ScanResult]:
+    """Async-iterator form of `scan_many`; takes the same arguments."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    if kwargs.get("cancel") is None:
+        kwargs["cancel"] = CancelToken()
+    cancel = kwargs["cancel"]
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:  # loop already closed after the consumer went away
+            cancel.cancel()
+
+    def produce():
+        try:
+            for result in scan_many(*args, **kwargs):
+                put(result)
+        except BaseException as e:
+            put(e)
+        finally:
+            put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancel.cancel()
@@ -0,0 +1,124 @@
+"""
+checkpoint.py
+-------------
+Periodic checkpointing for long PortHoundX sweeps.
+
+A checkpoint is two files:
+  - `<path>`: a small JSON state file (scan parameters, seed, and the plan
+    position every probe before which has completed), rewritten atomically;
+  - `<path>.results.jsonl`: an append-only journal of finished probes, one
+    batch per line, so each checkpoint costs only the probes since the last
+    one instead of re-serializing the whole result set.
+
+Because a `ProbePlan` position fully determines the remaining work, resuming
+is just `plan.iter_from(state["position"])` plus replaying the journal.
+
+Usage (example):
+    from checkpoint import ScanCheckpoint
+
+    ckpt = ScanCheckpoint("sweep.ckpt")
+    ckpt.start({"targets": [...], "ports": [...], "seed": 7})
+    ckpt.record_probe("10.0.0.1", 22, True, 0.41)
+    ckpt.maybe_flush(position=1)
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+STATE_VERSION = 1
+
+
+class ScanCheckpoint:
+    """
+    Journal + state file pair for one sweep.
+
+    Parameters
+    ----------
+    path : str
+        State file path; the journal lives next to it.
+    interval : float
+        Minimum seconds between flushes in `maybe_flush`.
+    """
+
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.journal_path = path + ".results.jsonl"
+        self.interval = interval
+        self.state: Dict = {}
+        self._hosts: Dict[str, Dict] = {}
+        self._probes: List[list] = []
+        self._last_flush = time.monotonic()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def start(self, state: Dict) -> None:
+        """Begin a fresh checkpoint, discarding any previous journal."""
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.state = dict(state, version=STATE_VERSION, position=0, complete=False)
+        self._write_state()
+
+    def load(self) -> Tuple[Dict, Dict[str, Dict], List[list]]:
+        """
+        Return (state, hosts, probes) recorded so far.
+
+        `hosts` maps host → header dict and `probes` holds [host, port, status,
+        rtt_ms, race] rows (race is the dual-stack summary or None). Journal
+        batches past the saved position (written just before an interruption)
+        are still valid results and are kept; a torn final line is skipped.
+        """
+        with open(self.path) as f:
+            self.state = json.load(f)
+        if self.state.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {self.path}")
+
+        hosts: Dict[str, Dict] = {}
+        probes: List[list] = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        continue
+                    hosts.update(batch["hosts"])
+                    probes.extend(batch["probes"])
+        return self.state, hosts, probes
+
+    def record_host(self, host: str, header: Dict) -> None:
+        self._hosts[host] = header
+
+    def record_probe(
+        self, host: str, port: int, status, rtt_ms: Optional[float], race: Optional[Dict] = None
+    ) -> None:
+        self._probes.append([host, port, status, rtt_ms, race])
+
+    def maybe_flush(self, position: int) -> None:
+        """Flush if `interval` seconds have passed; cheap enough to call per probe."""
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush(position)
+
+    def flush(self, position: int, complete: bool = False) -> None:
+        """Append pending probes to the journal, then record `position` in the state file."""
+        if self._hosts or self._probes:
+            line = json.dumps({"position": position, "hosts": self._hosts, "probes": self._probes})
+            with open(self.journal_path, "a") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._hosts, self._probes = {}, []
+        self.state["position"] = position
+        self.state["complete"] = complete
+        self._write_state()
+        self._last_flush = time.monotonic()
+
+    def _write_state(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
@@ -0,0 +1,221 @@
+"""
+columnar.py
+-----------
+Columnar export of PortHoundX scan results.
+
+Results dicts (as returned by `PortHoundXDiagnostics.collect`) are flattened
+into parallel NumPy arrays, one row per (host, port) probe, so large scans can
+be stored compactly and analysed vectorized without per-row Python objects.
+
+Columns:
+    host_id    uint32   index into the `hosts` array
+    ip_version uint8    4, 6, or 0 when the host did not resolve
+    ip_hi      uint64   upper 64 bits of the address (0 for IPv4)
+    ip_lo      uint64   lower 64 bits of the address (the IPv4 address itself)
+    port       uint16
+    status     uint8    see STATUS_NAMES
+    service    uint8    index into SERVICE_NAMES
+    cloud      uint8    index into CLOUD_NAMES
+    rtt_ms     float32  NaN when not measured
+    hosts      str      unique host names
+
+Usage (example):
+    import columnar
+
+    cols = columnar.results_to_columns([results_a, results_b])
+    columnar.save(cols, "scan.npz")
+    df = columnar.to_dataframe(columnar.load("scan.npz"))
+    print(columnar.open_ports_by_subnet(cols, prefix=24))
+"""
+
+import ipaddress
+from array import array
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from diagnosis_map import PORT_SERVICES
+
+# ------------------------------
+# Code tables
+# ------------------------------
+STATUS_NAMES: List[str] = ["closed", "open", "resource_exhausted"]
+STATUS_CLOSED = STATUS_NAMES.index("closed")
+STATUS_OPEN = STATUS_NAMES.index("open")
+STATUS_RESOURCE_EXHAUSTED = STATUS_NAMES.index("resource_exhausted")
+
+SERVICE_NAMES: List[str] = ["Unknown"] + sorted(set(PORT_SERVICES.values()))
+CLOUD_NAMES: List[str] = ["Unknown", "AWS", "Azure", "GCP", "Kubernetes"]
+
+# Port → service id lookup, so service ids are assigned with one fancy-index.
+_SERVICE_BY_PORT = np.zeros(65536, dtype=np.uint8)
+for _port, _name in PORT_SERVICES.items():
+    _SERVICE_BY_PORT[_port] = SERVICE_NAMES.index(_name)
+
+_NUMERIC_COLUMNS = {
+    "host_id": np.uint32,
+    "ip_version": np.uint8,
+    "ip_hi": np.uint64,
+    "ip_lo": np.uint64,
+    "port": np.uint16,
+    "status": np.uint8,
+    "service": np.uint8,
+    "cloud": np.uint8,
+    "rtt_ms": np.float32,
+}
+_KEY_COLUMNS = ["ip_version", "ip_hi", "ip_lo", "port"]
+_MASK64 = (1 << 64) - 1
+
+
+# ------------------------------
+# Building / IO
+# ------------------------------
+def _status_code(status) -> int:
+    """Map a results port value (bool, "Open (...)" or "Resource exhausted (...)") to a status code."""
+    if isinstance(status, str):
+        if status.lower().startswith("open"):
+            return STATUS_OPEN
+        return STATUS_RESOURCE_EXHAUSTED if status.startswith("Resource exhausted") else STATUS_CLOSED
+    return STATUS_OPEN if status else STATUS_CLOSED
+
+
+def results_to_columns(results_iter: Iterable[Dict]) -> Dict[str, np.ndarray]:
+    """Flatten results dicts into a dict of parallel column arrays."""
+    hosts: Dict[str, int] = {}
+    buf = {
+        "host_id": array("I"),
+        "ip_version": array("B"),
+        "ip_hi": array("Q"),
+        "ip_lo": array("Q"),
+        "port": array("H"),
+        "status": array("B"),
+        "cloud": array("B"),
+        "rtt_ms": array("f"),
+    }
+
+    for results in results_iter:
+        host_id = hosts.setdefault(results["host"], len(hosts))
+        try:
+            addr = ipaddress.ip_address(results["ip"])
+            version, value = addr.version, int(addr)
+        except ValueError:
+            version, value = 0, 0
+        cloud = results.get("cloud_provider")
+        cloud_id = CLOUD_NAMES.index(cloud) if cloud in CLOUD_NAMES else 0
+        rtts = results.get("rtt_ms", {})
+
+        for port, status in results["ports"].items():
+            buf["host_id"].append(host_id)
+            buf["ip_version"].append(version)
+            buf["ip_hi"].append(value >> 64)
+            buf["ip_lo"].append(value & _MASK64)
+            buf["port"].append(int(port))
+            buf["status"].append(_status_code(status))
+            buf["cloud"].append(cloud_id)
+            rtt = rtts.get(port)
+            buf["rtt_ms"].append(float("nan") if rtt is None else rtt)
+
+    cols = {
+        name: np.frombuffer(data, dtype=_NUMERIC_COLUMNS[name]).copy()
+        for name, data in buf.items()
+    }
+    cols["service"] = _SERVICE_BY_PORT[cols["port"]]
+    cols["hosts"] = np.array(list(hosts), dtype=str)
+    return cols
+
+
+def _require_parquet() -> None:
+    """Fail with an actionable message if no pandas Parquet engine is installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        try:
+            import fastparquet  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet files need pyarrow (pip install pyarrow); use a .npz path otherwise.") from None
+
+
+def save(cols: Dict[str, np.ndarray], path: str) -> None:
+    """Write columns to `path`; `.parquet` goes through pandas, anything else is .npz."""
+    if path.endswith(".parquet"):
+        _require_parquet()
+        to_dataframe(cols).to_parquet(path, index=False)
+    else:
+        np.savez_compressed(path, **cols)
+
+
+def load(path: str) -> Dict[str, np.ndarray]:
+    """Load columns written by `save`."""
+    if path.endswith(".parquet"):
+        import pandas as pd
+
+        _require_parquet()
+        df = pd.read_parquet(path)
+        cols = {name: df[name].to_numpy(dtype=dtype) for name, dtype in _NUMERIC_COLUMNS.items()}
+        host = df["host"].astype("category")
+        cols["host_id"] = host.cat.codes.to_numpy(dtype=np.uint32)
+        cols["hosts"] = host.cat.categories.to_numpy(dtype=str)
+        return cols
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def to_dataframe(cols: Dict[str, np.ndarray]):
+    """Build a pandas DataFrame; text columns are categoricals over the code tables."""
+    import pandas as pd
+
+    df = pd.DataFrame({name: cols[name] for name in _NUMERIC_COLUMNS})
+    df["host"] = pd.Categorical.from_codes(cols["host_id"].astype(np.int64), categories=cols["hosts"])
+    df["status_name"] = pd.Categorical.from_codes(cols["status"].astype(np.int64), categories=STATUS_NAMES)
+    df["service_name"] = pd.Categorical.from_codes(cols["service"].astype(np.int64), categories=SERVICE_NAMES)
+    df["cloud_name"] = pd.Categorical.from_codes(cols["cloud"].astype(np.int64), categories=CLOUD_NAMES)
+    return df
+
+
+# ------------------------------
+# Vectorized analytics
+# ------------------------------
+def open_ports_by_subnet(cols: Dict[str, np.ndarray], prefix: int = 24, prefix6: int = 64):
+    """Count open ports per IPv4 /prefix and IPv6 /prefix6 subnet (prefix6 <= 64)."""
+    import pandas as pd
+
+    is_open = cols["status"] == STATUS_OPEN
+    counts = {}
+    for version, prefixlen, values, shift in (
+        (4, prefix, cols["ip_lo"], 32 - prefix),
+        (6, prefix6, cols["ip_hi"], 64 - prefix6),
+    ):
+        mask = is_open & (cols["ip_version"] == version)
+        nets, n = np.unique(values[mask] >> np.uint64(shift), return_counts=True)
+        for net, count in zip(nets.tolist(), n.tolist()):
+            address = net << shift if version == 4 else net << (shift + 64)
+            counts[str(ipaddress.ip_network((address, prefixlen)))] = count
+    return pd.Series(counts, name="open_ports", dtype=np.int64)
+
+
+def open_ports_by_cloud(cols: Dict[str, np.ndarray]):
+    """Count open ports per cloud provider."""
+    import pandas as pd
+
+    mask = cols["status"] == STATUS_OPEN
+    counts = np.bincount(cols["cloud"][mask], minlength=len(CLOUD_NAMES))
+    return pd.Series(counts, index=CLOUD_NAMES, name="open_ports")
+
+
+def status_changes(before: Dict[str, np.ndarray], after: Dict[str, np.ndarray]):
+    """
+    Return the (host, ip, port) rows whose status differs between two scans.
+
+    Rows are matched per host as well as per address, so hostnames sharing an
+    IP (aliases fanned out from one probe) each get one row instead of being
+    cross-joined. Rows present in only one scan are included with the missing
+    side as NaN. Unresolved hosts have no address to match on and are left out.
+    """
+    key = _KEY_COLUMNS + ["host"]
+    frames = []
+    for cols in (before, after):
+        df = to_dataframe(cols)[key + ["status"]]
+        df = df[df["ip_version"] != 0]
+        frames.append(df.astype({"host": str}))  # the two scans have different host categories
+    merged = frames[0].merge(frames[1], on=key, how="outer", suffixes=("_before", "_after"))
+    return merged[merged["status_before"] != merged["status_after"]].reset_index(drop=True)
@@ -14,9 +14,16 @@ Usage (example):
     diag = build_diagnosis(port=22, status="closed", cloud="AWS")
     print(diag["possible_causes"])
     print(diag["suggested_fixes"])
+
+    # Many hosts: one diagnosis per group of identical findings, as they stream in
+    aggregator = DiagnosisAggregator()
+    for result in api.scan_many(targets, ports):
+        group = aggregator.add_scan_result(result)
+        if group and group["count"] == 1:
+            print(group["service"], group["status"], group["possible_causes"])
 """
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 # ------------------------------
 # Port → Service mapping
@@ -545,6 +552,130 @@ def dedupe_preserve_order(items: List[str]) -> List[str]:
     return out
 
 
+# ------------------------------
+# Fleet aggregation
+# ------------------------------
+
+_STATUS_LABELS: Dict[str, str] = {
+    "causes_open": "open",
+    "causes_closed": "closed",
+    "causes_filtered": "filtered",
+}
+
+def _host_signals(reachable: Optional[bool], ip: Optional[str], is_private: Optional[bool]) -> Dict[str, Optional[bool]]:
+    """Extra diagnosis signals derived from a scanned host's header fields."""
+    return {"ping_ok": reachable, "dns_ok": ip != "Unresolved", "is_private": is_private}
+
+
+class DiagnosisAggregator:
+    """
+    Group identical findings across many hosts/ports.
+
+    Two results with the same (service, status key, cloud, signal set) get the
+    same diagnosis, so it is built once per group and the group only records
+    which (host, port) pairs are affected. Results can be added one at a time
+    as they arrive; `report()` can be called at any point.
+
+    Parameters
+    ----------
+    max_targets : Optional[int]
+        Cap on the (host, port) pairs listed per group. `count` keeps growing
+        past the cap. None lists every affected target.
+    """
+
+    def __init__(self, max_targets: Optional[int] = None):
+        self.max_targets = max_targets
+        self._groups: Dict[Tuple, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    @staticmethod
+    def group_key(
+        port: int,
+        status: str,
+        cloud: Optional[str] = None,
+        extra_signals: Optional[Dict[str, bool]] = None,
+    ) -> Tuple:
+        """Return the grouping key for a single (port, status) finding."""
+        signals = tuple(sorted((extra_signals or {}).items()))
+        return (get_service_name(port), _status_key(status), cloud, signals)
+
+    def add(
+        self,
+        host: str,
+        port: int,
+        status: str,
+        cloud: Optional[str] = None,
+        extra_signals: Optional[Dict[str, bool]] = None,
+    ) -> Dict:
+        """
+        Record one finding and return the group it landed in.
+
+        A returned group with `count == 1` is new; streaming consumers can use
+        that to emit the diagnosis only once.
+        """
+        key = self.group_key(port, status, cloud, extra_signals)
+        group = self._groups.get(key)
+        if group is None:
+            diag = build_diagnosis(port, status, cloud, extra_signals)
+            service, status_key, _, signals = key
+            group = {
+                "service": service,
+                "status": _STATUS_LABELS[status_key],
+                "cloud": cloud,
+                "signals": dict(signals),
+                "possible_causes": diag["possible_causes"],
+                "suggested_fixes": diag["suggested_fixes"],
+                "count": 0,
+                "targets": [],
+            }
+            self._groups[key] = group
+
+        group["count"] += 1
+        if self.max_targets is None or len(group["targets"]) < self.max_targets:
+            group["targets"].append((host, port))
+        return group
+
+    def add_results(self, results: Dict) -> None:
+        """
+        Record every port of a `PortHoundXDiagnostics` results dict.
+
+        Port values may be booleans or "Open (<service>)" strings, as produced
+        with service detection enabled. Other strings (e.g. "Resource exhausted
+        (EMFILE)") describe the scanning host, not the target, and are skipped.
+        """
+        cloud = results.get("cloud_provider")
+        if cloud == "Unknown":
+            cloud = None
+        signals = _host_signals(results.get("reachable"), results.get("ip"), results.get("is_private"))
+        for port, status in results["ports"].items():
+            if isinstance(status, str):
+                if not status.lower().startswith("open"):
+                    continue
+                status = "open"
+            else:
+                status = "open" if status else "closed"
+            self.add(results["host"], int(port), status, cloud, signals)
+
+    def add_scan_result(self, result) -> Optional[Dict]:
+        """
+        Record one `api.ScanResult` and return its group, for streaming use.
+
+        A "resource_exhausted" result says nothing about the target and is
+        skipped (None is returned).
+        """
+        if result.status == "resource_exhausted":
+            return None
+        cloud = None if result.cloud_provider == "Unknown" else result.cloud_provider
+        signals = _host_signals(result.reachable, result.ip, result.is_private)
+        return self.add(result.host, result.port, result.status, cloud, signals)
+
+    def report(self) -> List[Dict]:
+        """Return one diagnosis per group, most widespread first."""
+        return sorted(self._groups.values(), key=lambda g: g["count"], reverse=True)
+
+
 # ------------------------------
 # Self-test / Demonstration
 # ------------------------------
@@ -0,0 +1,265 @@
+"""
+planner.py
+----------
+Probe-order planning for PortHoundX.
+
+A `ProbePlan` walks the host × port space without materializing it. Position
+`i` is mapped to a (host, port) pair on demand:
+
+  - hosts are interleaved, so consecutive probes hit different targets
+    instead of sweeping one host's ports back to back;
+  - with `randomize=True` the index space is shuffled by a keyed Feistel
+    permutation (cycle-walking keeps it a bijection over any size), so the
+    order is pseudo-random yet reproducible from the seed, in O(1) memory;
+  - with `prioritize=True` the well-known ports from PORT_SERVICES are probed
+    on every host before any other port.
+
+Because a position fully determines the probe, `plan.probe(i)` and
+`plan.iter_from(i)` make it cheap to resume a plan part-way through.
+
+Usage (example):
+    from planner import ProbePlan
+
+    plan = ProbePlan(["10.0.0.1", "10.0.0.2"], [22, 80, 8081], seed=7, prioritize=True)
+    for host, port in plan:
+        ...
+"""
+
+import bisect
+import ipaddress
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import utils
+from diagnosis_map import PORT_SERVICES
+
+_MASK64 = (1 << 64) - 1
+
+
+class TargetSet:
+    """
+    Indexable view over hosts, IPs and CIDR blocks without expanding them.
+
+    "10.0.0.0/24" contributes its usable host addresses (network and broadcast
+    excluded, as in `ip_network.hosts()`); anything else is a single target.
+    The target count is `size`: `len()` overflows past sys.maxsize, which an
+    IPv6 /64 already exceeds.
+    """
+
+    def __init__(self, specs: Sequence[str]):
+        self.specs = list(specs)
+        self._blocks: List[Tuple[int, int, int]] = []  # (first address, count, version); count 0 = plain host
+        self._offsets: List[int] = []
+        total = 0
+        for spec in self.specs:
+            self._offsets.append(total)
+            if "/" in spec:
+                net = ipaddress.ip_network(spec, strict=False)
+                first, count = int(net.network_address), net.num_addresses
+                if net.version == 4 and count > 2:
+                    first, count = first + 1, count - 2
+                elif net.version == 6 and count > 1:
+                    first, count = first + 1, count - 1
+                self._blocks.append((first, count, net.version))
+                total += count
+            else:
+                self._blocks.append((0, 0, 0))
+                total += 1
+        self.size = total
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < self.size:
+            raise IndexError("target index out of range")
+        i = bisect.bisect_right(self._offsets, index) - 1
+        first, count, version = self._blocks[i]
+        if not count:
+            return self.specs[i]
+        address = first + index - self._offsets[i]
+        return str(ipaddress.IPv4Address(address) if version == 4 else ipaddress.IPv6Address(address))
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self.size):
+            yield self[index]
+
+    def __contains__(self, target: str) -> bool:
+        """True if iterating the set would yield `target` (same bounds as indexing)."""
+        try:
+            address = ipaddress.ip_address(target)
+        except ValueError:
+            address = None
+        for spec, (first, count, version) in zip(self.specs, self._blocks):
+            if not count:
+                if spec == target:
+                    return True
+            elif address is not None and address.version == version and first <= int(address) < first + count:
+                return True
+        return False
+
+
+def collapse_aliases(
+    specs: Sequence[str], dual_stack: bool = False, workers: int = 32
+) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Resolve hostname targets and collapse those sharing an address.
+
+    Returns (probe_specs, aliases). CIDR blocks pass through unchanged; every
+    distinct resolved address appears once in probe_specs, and aliases maps
+    that probe target to the original specs it stands for. An address a CIDR
+    spec already walks is not probed a second time, only aliased; a block's
+    network/broadcast address is not walked, so a name resolving to one is
+    still probed on its own.
+
+    With `dual_stack`, hostnames are grouped by their full IPv4+IPv6 address
+    set and the first hostname of each group is probed (racing needs a name).
+    Unresolved hostnames are kept as their own probe targets.
+    """
+    blocks = TargetSet([s for s in specs if "/" in s])
+    names = list(dict.fromkeys(s for s in specs if "/" not in s))
+    resolve = utils.resolve_all if dual_stack else utils.resolve_host
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(names)))) as pool:
+        resolved = dict(zip(names, pool.map(resolve, names)))
+
+    probe_specs: List[str] = []
+    aliases: Dict[str, List[str]] = {}
+    by_key: Dict[object, str] = {}
+    for spec in dict.fromkeys(specs):
+        if "/" in spec:
+            probe_specs.append(spec)
+            continue
+        address = resolved[spec]
+        covered = False
+        if dual_stack:
+            key = tuple(sorted(address["ipv6"] + address["ipv4"])) or ("unresolved", spec)
+            target = spec
+        elif address == "Unresolved":
+            key = target = spec
+        else:
+            key = target = str(ipaddress.ip_address(address))
+            covered = target in blocks
+
+        if key in by_key:
+            aliases[by_key[key]].append(spec)
+            continue
+        by_key[key] = target
+        aliases[target] = [spec]
+        if not covered:
+            probe_specs.append(target)
+    return probe_specs, aliases
+
+
+def _size(hosts) -> int:
+    """Number of targets in `hosts`, without len() overflowing on huge target sets."""
+    size = getattr(hosts, "size", None)
+    return len(hosts) if size is None else size
+
+
+class FeistelPermutation:
+    """Keyed pseudo-random bijection over range(size), evaluated per index."""
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        bits += bits % 2
+        self._half = bits // 2
+        self._mask = (1 << self._half) - 1
+        rng = random.Random(seed)
+        self._keys = [rng.getrandbits(64) for _ in range(self.ROUNDS)]
+
+    def _round(self, value: int, key: int) -> int:
+        x = (value * 0x9E3779B97F4A7C15 + key) & _MASK64
+        x ^= x >> 31
+        x = (x * 0xBF58476D1CE4E5B9) & _MASK64
+        x ^= x >> 29
+        return x & self._mask
+
+    def __call__(self, index: int) -> int:
+        value = index
+        while True:
+            left, right = value >> self._half, value & self._mask
+            for key in self._keys:
+                left, right = right, left ^ self._round(right, key)
+            value = (left << self._half) | right
+            # Cycle-walk: the Feistel domain is up to 4x larger than `size`.
+            if value < self.size:
+                return value
+
+
+class ProbePlan:
+    """
+    Lazy (host, port) probe order.
+
+    Parameters
+    ----------
+    hosts : Sequence
+        Anything with integer indexing and a `size` attribute (TargetSet) or
+        len() (list).
+    ports : Sequence[int]
+        Ports to probe on every host.
+    seed : Optional[int]
+        Permutation seed; a random one is drawn (and kept on `self.seed`) if None.
+    randomize : bool
+        Shuffle the order instead of walking it port by port, host by host.
+    prioritize : bool
+        Probe ports listed in PORT_SERVICES on all hosts before the rest.
+
+    The number of probes is `size` (see `TargetSet` on why not `len()`).
+    """
+
+    def __init__(
+        self,
+        hosts: Sequence,
+        ports: Sequence[int],
+        seed: Optional[int] = None,
+        randomize: bool = True,
+        prioritize: bool = False,
+    ):
+        self.hosts = hosts
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.randomize = randomize
+        self.prioritize = prioritize
+
+        ports = list(ports)
+        if prioritize:
+            tiers = [
+                [p for p in ports if p in PORT_SERVICES],
+                [p for p in ports if p not in PORT_SERVICES],
+            ]
+        else:
+            tiers = [ports]
+        n_hosts = _size(hosts)
+        self._n_hosts = n_hosts
+        self._tiers: List[Tuple[int, List[int], Optional[FeistelPermutation]]] = []
+        for i, tier_ports in enumerate(t for t in tiers if t):
+            size = n_hosts * len(tier_ports)
+            perm = FeistelPermutation(size, self.seed + i) if randomize and size > 1 else None
+            self._tiers.append((size, tier_ports, perm))
+
+        self.size = sum(size for size, _, _ in self._tiers)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def probe(self, index: int) -> Tuple[object, int]:
+        """Return the (host, port) probed at position `index`."""
+        if index < 0:
+            raise IndexError("probe index out of range")
+        for size, tier_ports, perm in self._tiers:
+            if index < size:
+                slot = perm(index) if perm else index
+                return self.hosts[slot % self._n_hosts], tier_ports[slot // self._n_hosts]
+            index -= size
+        raise IndexError("probe index out of range")
+
+    def iter_from(self, start: int = 0) -> Iterator[Tuple[object, int]]:
+        """Yield (host, port) pairs from position `start` to the end of the plan."""
+        for index in range(start, self.size):
+            yield self.probe(index)
+
+    def __iter__(self) -> Iterator[Tuple[object, int]]:
+        return self.iter_from(0)
@@ -2,49 +2,255 @@ import argparse
 import tkinter as tk
 from tkinter import scrolledtext, messagebox
 import utils
+from checkpoint import ScanCheckpoint
+from diagnosis_map import DiagnosisAggregator
+from planner import ProbePlan, TargetSet, collapse_aliases
 
 
 class PortHoundXDiagnostics:
-    def __init__(self, host, ports, detect_services=False):
+    def __init__(
+        self,
+        host,
+        ports,
+        detect_services=False,
+        randomize=False,
+        prioritize=False,
+        seed=None,
+        dual_stack=False,
+        sources=None,
+    ):
         self.host = host
         self.ports = ports
         self.detect_services = detect_services
+        self.randomize = randomize
+        self.prioritize = prioritize
+        self.seed = seed
+        self.dual_stack = dual_stack
+        self.sources = utils.SourcePool(sources) if sources else None
+
+    def collect(self):
+        results = utils.host_header(self.host, self.dual_stack)
+        ip = results["ip"]
+
+        # Scan ports in planned order; results stay keyed in the requested order
+        plan = ProbePlan([ip], self.ports, seed=self.seed, randomize=self.randomize, prioritize=self.prioritize)
+        results["ports"] = dict.fromkeys(self.ports)
+        for _, port in plan:
+            utils.probe_into(results, port, self.dual_stack, sources=self.sources)
+
+        # If enabled, detect service type
+        if self.detect_services:
+            utils.label_services(results)
+
+        return results
 
     def run(self, json_output=False):
-        ip = utils.resolve_host(self.host)
-        is_private = utils.is_private_ip(ip)
-        reachable = utils.is_reachable(ip)
-
-        results = {
-            "host": self.host,
-            "ip": ip,
-            "is_private": is_private,
-            "reachable": reachable,
-            "ports": {},
-            "cloud_provider": utils.detect_cloud_provider(ip),
+        results = self.collect()
+        if json_output:
+            return utils.to_json(results)
+        else:
+            return utils.format_human_readable(results)
+
+
+class PortHoundXSweep:
+    """
+    Scan many targets (hosts, IPs, CIDR blocks) through one interleaved plan.
+
+    With `dedupe` (the default), hostnames resolving to the same address are
+    probed once and the result is reported for each of them, listing the
+    other names under "aliases".
+
+    With `checkpoint` set, progress is saved to that state file every
+    `checkpoint_interval` seconds and `collect(resume=True)` continues an
+    interrupted sweep from its last saved position without re-probing.
+    """
+
+    def __init__(
+        self,
+        targets,
+        ports,
+        detect_services=False,
+        randomize=False,
+        prioritize=False,
+        seed=None,
+        dual_stack=False,
+        sources=None,
+        dedupe=True,
+        checkpoint=None,
+        checkpoint_interval=5.0,
+    ):
+        self.targets = list(targets)
+        self.ports = list(ports)
+        self.detect_services = detect_services
+        self.randomize = randomize
+        self.prioritize = prioritize
+        self.seed = seed
+        self.dual_stack = dual_stack
+        self.sources = utils.SourcePool(sources) if sources else None
+        self.dedupe = dedupe
+        self.checkpoint = ScanCheckpoint(checkpoint, checkpoint_interval) if checkpoint else None
+
+    def _scan_state(self, seed):
+        return {
+            "targets": self.targets,
+            "ports": self.ports,
+            "randomize": self.randomize,
+            "prioritize": self.prioritize,
+            "seed": seed,
+            "dual_stack": self.dual_stack,
+            "dedupe": self.dedupe,
         }
 
-        # Scan ports
-        for port in self.ports:
-            status = utils.scan_port(ip, port)
-            results["ports"][port] = status
+    def _probe_targets(self):
+        """Return (probe specs, probe target → requested hostnames)."""
+        if self.dedupe:
+            return collapse_aliases(self.targets, dual_stack=self.dual_stack)
+        return self.targets, {t: [t] for t in dict.fromkeys(self.targets) if "/" not in t}
 
-            # If enabled, detect service type
-            if self.detect_services and status:
-                service = utils.detect_service(ip, port)
-                results["ports"][port] = f"Open ({service})"
+    def collect(self, resume=False):
+        hosts = {}
+        position = 0
+        seed = self.seed
+
+        if resume:
+            if not (self.checkpoint and self.checkpoint.exists()):
+                raise ValueError("Nothing to resume: checkpoint file not found.")
+            state, headers, probes = self.checkpoint.load()
+            seed = state["seed"] if seed is None else seed
+            if {k: state.get(k) for k in self._scan_state(seed)} != self._scan_state(seed):
+                raise ValueError("Checkpoint was written for a different scan (targets/ports/options differ).")
+            position = state["position"]
+            # Reuse the saved resolution: the plan must walk the same target space.
+            probe_specs, aliases = state["probe_targets"], state["aliases"]
+            for host, header in headers.items():
+                header["ports"], header["rtt_ms"] = {}, {}
+                hosts[host] = header
+            for host, port, status, rtt, race in probes:
+                hosts[host]["ports"][port] = status
+                hosts[host]["rtt_ms"][port] = rtt
+                if race is not None:
+                    hosts[host].setdefault("dual_stack", {})[port] = race
+        else:
+            probe_specs, aliases = self._probe_targets()
 
+        targets = TargetSet(probe_specs)
+        plan = ProbePlan(targets, self.ports, seed=seed, randomize=self.randomize, prioritize=self.prioritize)
+        if self.checkpoint and not resume:
+            self.checkpoint.start(dict(self._scan_state(plan.seed), probe_targets=probe_specs, aliases=aliases))
+
+        done = position  # probes finished so far; the resume point if interrupted
+        try:
+            for position, (host, port) in enumerate(plan.iter_from(position), start=position):
+                if host not in hosts:
+                    hosts[host] = utils.host_header(host, self.dual_stack)
+                    if self.checkpoint:
+                        header = {k: v for k, v in hosts[host].items() if k not in ("ports", "rtt_ms")}
+                        self.checkpoint.record_host(host, header)
+                entry = hosts[host]
+                race = utils.probe_into(entry, port, self.dual_stack, sources=self.sources)
+                if self.checkpoint:
+                    self.checkpoint.record_probe(host, port, entry["ports"][port], entry["rtt_ms"][port], race)
+                # Advance only once the probe is journaled: an interrupt in between
+                # must not flush a position covering an unrecorded probe.
+                done = position + 1
+                if self.checkpoint:
+                    self.checkpoint.maybe_flush(done)
+        except (KeyboardInterrupt, SystemExit):
+            if self.checkpoint:
+                self.checkpoint.flush(done)
+            raise
+
+        if self.checkpoint:
+            self.checkpoint.flush(plan.size, complete=True)
+
+        # Finish each probed entry once, ports in the requested order
+        for entry in hosts.values():
+            entry["ports"] = {p: entry["ports"][p] for p in self.ports}
+            entry["rtt_ms"] = {p: entry["rtt_ms"][p] for p in self.ports}
+            if self.detect_services:
+                utils.label_services(entry)
+
+        # Fan results back out to the requested targets, in request order
+        probed_as = {name: target for target, names in aliases.items() for name in names}
+        results = []
+        for spec in dict.fromkeys(self.targets):
+            if "/" in spec:
+                results.extend(hosts[host] for host in TargetSet([spec]) if host in hosts)
+                continue
+            target = probed_as[spec]
+            if target not in hosts:
+                continue
+            entry = hosts[target]
+            entry = dict(entry, host=spec, ports=dict(entry["ports"]), rtt_ms=dict(entry["rtt_ms"]))
+            others = [name for name in aliases[target] if name != spec]
+            if others:
+                entry["aliases"] = others
+            results.append(entry)
+        return results
+
+    @staticmethod
+    def diagnose(results):
+        """One diagnosis per group of identical findings across `results`, most widespread first."""
+        aggregator = DiagnosisAggregator()
+        for entry in results:
+            aggregator.add_results(entry)
+        return aggregator.report()
+
+    def run(self, json_output=False, resume=False):
+        results = self.collect(resume=resume)
         if json_output:
             return utils.to_json(results)
         else:
-            return utils.format_human_readable(results)
+            return "\n\n".join(utils.format_human_readable(r) for r in results)
 
 
 # ---------------- CLI Handling ----------------
 def cli_mode(args):
-    diag = PortHoundXDiagnostics(args.host, args.ports, detect_services=args.detect_services)
-    output = diag.run(json_output=args.json)
-    print(output)
+    diag = PortHoundXDiagnostics(
+        args.host,
+        args.ports,
+        detect_services=args.detect_services,
+        randomize=args.randomize,
+        prioritize=args.prioritize,
+        seed=args.seed,
+        dual_stack=args.dual_stack,
+        sources=args.source_address,
+    )
+    results = diag.collect()
+    if args.export:
+        import columnar  # numpy/pandas are only needed for exports
+
+        columnar.save(columnar.results_to_columns([results]), args.export)
+    print(utils.to_json(results) if args.json else utils.format_human_readable(results))
+
+
+def sweep_mode(args):
+    sweep = PortHoundXSweep(
+        args.targets or [args.host],
+        args.ports,
+        detect_services=args.detect_services,
+        randomize=args.randomize,
+        prioritize=args.prioritize,
+        seed=args.seed,
+        dual_stack=args.dual_stack,
+        sources=args.source_address,
+        dedupe=not args.no_dedupe,
+        checkpoint=args.checkpoint,
+        checkpoint_interval=args.checkpoint_interval,
+    )
+    results = sweep.collect(resume=args.resume)
+    if args.export:
+        import columnar  # numpy/pandas are only needed for exports
+
+        columnar.save(columnar.results_to_columns(results), args.export)
+    diagnosis = sweep.diagnose(results) if args.aggregate else None
+    if args.json:
+        print(utils.to_json(results if diagnosis is None else {"results": results, "diagnosis": diagnosis}))
+    else:
+        reports = [utils.format_human_readable(r) for r in results]
+        if diagnosis is not None:
+            reports.append(utils.format_diagnosis_report(diagnosis))
+        print("\n\n".join(reports))
 
 
 # ---------------- GUI Handling ----------------
@@ -100,16 +306,42 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="PortHoundX - Multi-Cloud Diagnostics Tool")
 
     parser.add_argument("--host", help="Host or IP address to scan")
+    parser.add_argument("--targets", nargs="+", help="Hosts, IPs or CIDR blocks to sweep")
     parser.add_argument("--ports", nargs="+", type=int, default=[22, 80, 443], help="Ports to scan")
     parser.add_argument("--json", action="store_true", help="Output in JSON format")
     parser.add_argument("--detect-services", action="store_true", help="Detect running services")
     parser.add_argument("--gui", action="store_true", help="Run in GUI mode")
+    parser.add_argument("--randomize", action="store_true", help="Probe in a seeded pseudo-random order")
+    parser.add_argument("--prioritize", action="store_true", help="Probe well-known service ports first")
+    parser.add_argument("--seed", type=int, help="Seed for --randomize (reproducible order)")
+    parser.add_argument("--dual-stack", action="store_true", help="Race IPv6/IPv4 addresses per port (Happy Eyeballs)")
+    parser.add_argument(
+        "--source-address", action="append", metavar="ADDR", help="Local address to probe from (repeat to rotate)"
+    )
+    parser.add_argument(
+        "--no-dedupe", action="store_true", help="Probe every --targets hostname even if they share an address"
+    )
+    parser.add_argument("--export", metavar="PATH", help="Also write columnar results to a .npz or .parquet file")
+    parser.add_argument("--checkpoint", metavar="PATH", help="Save sweep progress to this state file")
+    parser.add_argument("--checkpoint-interval", type=float, default=5.0, help="Seconds between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="Resume the sweep saved in --checkpoint")
+    parser.add_argument(
+        "--aggregate", action="store_true", help="Add one diagnosis per group of identical findings across targets"
+    )
 
     args = parser.parse_args()
 
-    if args.gui:
-        gui_mode()
-    elif args.host:
-        cli_mode(args)
-    else:
-        parser.error("Either --host (for CLI) or --gui must be provided.")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint.")
+
+    try:
+        if args.gui:
+            gui_mode()
+        elif args.targets or (args.host and (args.checkpoint or args.aggregate)):
+            sweep_mode(args)  # a checkpointed/aggregated --host is a one-target sweep
+        elif args.host:
+            cli_mode(args)
+        else:
+            parser.error("Either --host/--targets (for CLI) or --gui must be provided.")
+    except (ValueError, ImportError) as e:  # bad source address, mismatched checkpoint, no Parquet engine, ...
+        parser.error(str(e))
@@ -1,24 +1,62 @@
 import socket
 import json
+import errno
 import ipaddress
+import itertools
+import os
+import selectors
+import struct
 import subprocess
+import threading
+import time
+
+# Local resource errors (fds, ephemeral ports, buffers): a failed probe with
+# one of these says nothing about the target and must not read as "closed".
+RESOURCE_ERRNOS = {errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EADDRNOTAVAIL, errno.EADDRINUSE}
+RESOURCE_EXHAUSTED = "Resource exhausted"
+
+
+class ResourceExhausted(OSError):
+    """The local host ran out of sockets/ports while probing"""
 
 
 # ---------------- Networking Utilities ----------------
+def resolve_all(host):
+    """Resolve hostname to all of its addresses, split by family"""
+    addresses = {"ipv6": [], "ipv4": []}
+    try:
+        infos = socket.getaddrinfo(host, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        return addresses
+    for family, _, _, _, sockaddr in infos:
+        key = "ipv6" if family == socket.AF_INET6 else "ipv4"
+        if sockaddr[0] not in addresses[key]:
+            addresses[key].append(sockaddr[0])
+    return addresses
+
+
 def resolve_host(host):
-    """Resolve hostname to IP address"""
+    """Resolve hostname to IP address (IPv4 or IPv6, in system preference order)"""
     try:
-        return socket.gethostbyname(host)
-    except socket.gaierror:
+        return socket.getaddrinfo(host, None, socket.AF_UNSPEC, socket.SOCK_STREAM)[0][4][0]
+    except (socket.gaierror, UnicodeError, IndexError):
         return "Unresolved"
 
 
+def ip_family(ip):
+    """Return the socket address family for an IP string"""
+    return socket.AF_INET6 if ipaddress.ip_address(ip).version == 6 else socket.AF_INET
+
+
 def is_private_ip(ip):
     """Check if IP is private"""
     try:
-        return ipaddress.ip_address(ip).is_private
+        addr = ipaddress.ip_address(ip)
     except ValueError:
         return False
+    if addr.version == 6 and addr.ipv4_mapped:
+        addr = addr.ipv4_mapped
+    return addr.is_private
 
 
 def is_reachable(ip):
@@ -34,14 +72,98 @@ def is_reachable(ip):
         return False
 
 
-def scan_port(ip, port, timeout=1.0):
-    """Check if a port is open"""
+def scan_port(ip, port, timeout=1.0, source=None, abortive_close=False):
+    """
+    Check if a port is open.
+
+    `source` binds the probe to a local address. `abortive_close` closes an
+    open probe with a RST (SO_LINGER 0) so no TIME_WAIT socket is left behind.
+    Raises ResourceExhausted on local fd/ephemeral-port exhaustion.
+    """
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        with socket.socket(ip_family(ip), socket.SOCK_STREAM) as sock:
+            if source:
+                sock.bind((source, 0))
             sock.settimeout(timeout)
-            return sock.connect_ex((ip, port)) == 0
+            result = sock.connect_ex((ip, port))
+            if result == 0 and abortive_close:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    except OSError as e:
+        if e.errno in RESOURCE_ERRNOS:
+            raise ResourceExhausted(e.errno, e.strerror) from e
+        return False
     except Exception:
         return False
+    if result in RESOURCE_ERRNOS:
+        raise ResourceExhausted(result, os.strerror(result))
+    return result == 0
+
+
+def is_resource_exhausted(status):
+    """Check whether a port status records local resource exhaustion"""
+    return isinstance(status, str) and status.startswith(RESOURCE_EXHAUSTED)
+
+
+# ---------------- Probe Resource Budget ----------------
+def fd_budget(reserve=64, per_probe=1):
+    """Concurrent probes allowed by the RLIMIT_NOFILE soft limit, keeping `reserve` fds spare"""
+    try:
+        import resource
+
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, OSError, ValueError):
+        return 256  # no rlimit API (Windows): conservative default
+    if soft == resource.RLIM_INFINITY:
+        soft = 65536
+    return max(1, (soft - reserve) // per_probe)
+
+
+def ephemeral_port_budget(n_sources=1):
+    """Local ports available for outgoing connects, per the kernel's ephemeral range"""
+    try:
+        with open("/proc/sys/net/ipv4/ip_local_port_range") as f:
+            low, high = (int(x) for x in f.read().split())
+    except (OSError, ValueError):
+        low, high = 49152, 65535  # IANA range, used by Windows/BSD/macOS
+    return (high - low + 1) * max(1, n_sources)
+
+
+def max_concurrency(cap=512, n_sources=1, per_probe=1):
+    """Concurrency the connect engine can sustain without running out of fds or ports"""
+    return max(1, min(cap, fd_budget(per_probe=per_probe), ephemeral_port_budget(n_sources) // per_probe))
+
+
+class SourcePool:
+    """Round-robin local source addresses per family, spreading probes over several ephemeral port ranges"""
+
+    def __init__(self, addresses):
+        self.addresses = list(addresses)
+        by_family = {socket.AF_INET: [], socket.AF_INET6: []}
+        for address in self.addresses:
+            # Fail fast on addresses this host does not own, so a typo is not
+            # later reported as port exhaustion (both surface as EADDRNOTAVAIL).
+            try:
+                with socket.socket(ip_family(address), socket.SOCK_STREAM) as sock:
+                    sock.bind((address, 0))
+            except (OSError, ValueError) as e:
+                raise ValueError(f"Invalid source address {address!r}: {e}") from e
+            by_family[ip_family(address)].append(address)
+        self._cycles = {family: itertools.cycle(addrs) for family, addrs in by_family.items() if addrs}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def pick(self, ip):
+        """Return the next source address matching `ip`'s family, or None"""
+        try:
+            cycle = self._cycles.get(ip_family(ip))
+        except ValueError:
+            return None
+        if cycle is None:
+            return None
+        with self._lock:
+            return next(cycle)
 
 
 def detect_service(ip, port):
@@ -57,17 +179,214 @@ def detect_service(ip, port):
     return common_services.get(port, "Unknown Service")
 
 
+def race_connect(host, port, timeout=1.0, stagger=0.25, sources=None, abortive_close=True, addresses=None):
+    """
+    Happy-Eyeballs style connect (RFC 8305): try every address of `host`,
+    alternating families starting with IPv6, launching the next attempt every
+    `stagger` seconds (or as soon as one fails) until one connects.
+
+    Returns a dict with the winning address/family/latency plus every attempt
+    and a per-family summary ("open", "closed", "filtered", "error",
+    "resource_exhausted", "cancelled" or "unresolved"). `sources` is an
+    optional SourcePool; `abortive_close` resets the winning connection.
+    `addresses` is a `resolve_all(host)` result to reuse; `host` is resolved
+    when it is None. Raises ResourceExhausted if not even the selector can be
+    created.
+    """
+    if addresses is None:
+        addresses = resolve_all(host)
+    v6, v4 = addresses["ipv6"], addresses["ipv4"]
+    order = [ip for pair in zip(v6, v4) for ip in pair] + v6[len(v4):] + v4[len(v6):]
+
+    attempts = []
+    pending = {}
+    winner = None
+    try:
+        sel = selectors.DefaultSelector()
+    except OSError as e:
+        if e.errno in RESOURCE_ERRNOS:
+            raise ResourceExhausted(e.errno, e.strerror) from e
+        raise
+    next_index, next_start = 0, time.perf_counter()
+
+    def finish(sock, attempt, status):
+        attempt["status"] = status
+        attempt["latency_ms"] = round((time.perf_counter() - attempt.pop("_started")) * 1000, 3)
+        sel.unregister(sock)
+        if status == "open" and abortive_close:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        sock.close()
+        del pending[sock]
+
+    def failure(err):
+        if err == errno.ECONNREFUSED:
+            return "closed"
+        return "resource_exhausted" if err in RESOURCE_ERRNOS else "error"
+
+    try:
+        while winner is None and (next_index < len(order) or pending):
+            now = time.perf_counter()
+            if next_index < len(order) and (now >= next_start or not pending):
+                ip = order[next_index]
+                next_index += 1
+                attempt = {"ip": ip, "family": "ipv6" if ":" in ip else "ipv4", "status": "error", "latency_ms": None}
+                attempts.append(attempt)
+                source = sources.pick(ip) if sources else None
+                sock = None
+                try:
+                    sock = socket.socket(ip_family(ip), socket.SOCK_STREAM)
+                    sock.setblocking(False)
+                    if source:
+                        sock.bind((source, 0))
+                    attempt["_started"] = time.perf_counter()
+                    err = sock.connect_ex((ip, port))
+                except OSError as e:
+                    attempt["status"] = failure(e.errno)
+                    attempt.pop("_started", None)
+                    if sock is not None:
+                        sock.close()
+                    continue
+                pending[sock] = attempt
+                sel.register(sock, selectors.EVENT_WRITE, attempt)
+                if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                    finish(sock, attempt, failure(err))
+                    continue
+                next_start = now + stagger
+                continue
+
+            deadlines = [a["_started"] + timeout for a in pending.values()]
+            if next_index < len(order):
+                deadlines.append(next_start)
+            for key, _ in sel.select(max(0.0, min(deadlines) - now)):
+                sock, attempt = key.fileobj, key.data
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    finish(sock, attempt, "open")
+                    winner = attempt
+                    break
+                finish(sock, attempt, failure(err))
+                next_start = time.perf_counter()  # a failure starts the next attempt right away
+
+            now = time.perf_counter()
+            for sock, attempt in list(pending.items()):
+                if winner is None and now - attempt["_started"] >= timeout:
+                    finish(sock, attempt, "filtered")
+    finally:
+        for sock, attempt in list(pending.items()):
+            finish(sock, attempt, "cancelled")
+        sel.close()
+
+    rank = ["open", "closed", "filtered", "error", "resource_exhausted", "cancelled"]
+    families = {}
+    for family, ips in (("ipv6", v6), ("ipv4", v4)):
+        statuses = [a["status"] for a in attempts if a["family"] == family]
+        if not ips:
+            families[family] = "unresolved"
+        elif statuses:
+            families[family] = min(statuses, key=rank.index)
+        else:
+            families[family] = "cancelled"  # never tried: an earlier attempt won
+
+    return {
+        "open": winner is not None,
+        "winner": winner["ip"] if winner else None,
+        "family": winner["family"] if winner else None,
+        "latency_ms": winner["latency_ms"] if winner else None,
+        "families": families,
+        "attempts": attempts,
+    }
+
+
+# ---------------- Scan Helpers ----------------
+def host_header(host, dual_stack=False):
+    """Resolve `host` and build its results dict, ports not yet scanned; dual-stack keeps every address to race"""
+    ip = resolve_host(host)
+    header = {
+        "host": host,
+        "ip": ip,
+        "is_private": is_private_ip(ip),
+        "reachable": is_reachable(ip),
+        "ports": {},
+        "rtt_ms": {},
+        "cloud_provider": detect_cloud_provider(ip),
+    }
+    if dual_stack:
+        header["addresses"] = resolve_all(host)
+    return header
+
+
+def timed_scan(ip, port, timeout=1.0, source=None, abortive_close=True):
+    """Scan one port, returning (status, connect time in ms)"""
+    started = time.perf_counter()
+    try:
+        status = scan_port(ip, port, timeout, source, abortive_close)
+    except ResourceExhausted as e:
+        return f"{RESOURCE_EXHAUSTED} ({errno.errorcode.get(e.errno, e.errno)})", None
+    return status, round((time.perf_counter() - started) * 1000, 3)
+
+
+def probe_port(host, ip, port, dual_stack=False, timeout=1.0, sources=None, addresses=None):
+    """Scan one port, returning (status, RTT in ms, dual-stack race summary or None)"""
+    if dual_stack:
+        try:
+            race = race_connect(host, port, timeout=timeout, sources=sources, addresses=addresses)
+        except ResourceExhausted as e:
+            return f"{RESOURCE_EXHAUSTED} ({errno.errorcode.get(e.errno, e.errno)})", None, None
+        summary = {k: race[k] for k in ("winner", "family", "families")}
+        if not race["open"] and "resource_exhausted" in race["families"].values():
+            return f"{RESOURCE_EXHAUSTED} (dual-stack race)", None, summary
+        return race["open"], race["latency_ms"], summary
+    source = sources.pick(ip) if sources else None
+    status, rtt = timed_scan(ip, port, timeout, source)
+    return status, rtt, None
+
+
+def probe_into(results, port, dual_stack=False, timeout=1.0, sources=None):
+    """Scan one port of `results["host"]`, recording status and RTT in place; returns the race summary or None"""
+    status, rtt, race = probe_port(
+        results["host"], results["ip"], port, dual_stack, timeout, sources, results.get("addresses")
+    )
+    results["ports"][port] = status
+    results["rtt_ms"][port] = rtt
+    if race is not None:
+        results.setdefault("dual_stack", {})[port] = race
+    return race
+
+
+def label_services(results):
+    """Replace open port statuses with "Open (<service>)" labels"""
+    for port, status in results["ports"].items():
+        if status is True:
+            service = detect_service(results["ip"], port)
+            results["ports"][port] = f"Open ({service})"
+
+
 # ---------------- Cloud Provider Detection ----------------
+# Placeholder ranges, not the providers' full published lists.
+CLOUD_NETWORKS = {
+    "GCP": ["35.0.0.0/8", "34.0.0.0/8", "2600:1900::/28"],
+    "AWS": ["13.0.0.0/8", "52.0.0.0/8", "3.0.0.0/8", "2600:1f00::/24", "2a05:d000::/25"],
+    "Azure": ["20.0.0.0/8", "40.0.0.0/8", "2603:1000::/24"],
+}
+_CLOUD_NETWORKS = [
+    (provider, ipaddress.ip_network(cidr))
+    for provider, cidrs in CLOUD_NETWORKS.items()
+    for cidr in cidrs
+]
+
+
 def detect_cloud_provider(ip):
-    """Basic cloud provider detection (placeholder rules)"""
-    if ip.startswith("35.") or ip.startswith("34."):
-        return "GCP"
-    elif ip.startswith("13.") or ip.startswith("52.") or ip.startswith("3."):
-        return "AWS"
-    elif ip.startswith("20.") or ip.startswith("40."):
-        return "Azure"
-    else:
+    """Basic cloud provider detection (placeholder rules, IPv4 and IPv6)"""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
         return "Unknown"
+    if addr.version == 6 and addr.ipv4_mapped:
+        addr = addr.ipv4_mapped
+    for provider, network in _CLOUD_NETWORKS:
+        if addr in network:
+            return provider
+    return "Unknown"
 
 
 # ---------------- Output Formatting ----------------
@@ -80,13 +399,38 @@ def format_human_readable(results):
     output = []
     output.append(f"Host: {results['host']}")
     output.append(f"IP: {results['ip']}")
+    if results.get("aliases"):
+        output.append(f"Aliases: {', '.join(results['aliases'])} (same probe)")
     output.append(f"Private: {results['is_private']}")
     output.append(f"Reachable: {'✅ Yes' if results['reachable'] else '❌ No'}")
     output.append("Ports:")
     for port, status in results["ports"].items():
-        if isinstance(status, str):  # when service detection is enabled
+        if is_resource_exhausted(status):
+            output.append(f"  - {port}: ⚠️ {status}")
+        elif isinstance(status, str):  # when service detection is enabled
             output.append(f"  - {port}: ✅ {status}")
         else:
             output.append(f"  - {port}: {'✅ Open' if status else '❌ Closed'}")
+        race = results.get("dual_stack", {}).get(port)
+        if race:
+            families = ", ".join(f"{family}: {state}" for family, state in race["families"].items())
+            winner = f"{race['family']} won in {results['rtt_ms'][port]} ms" if race["winner"] else "no winner"
+            output.append(f"      {winner} ({families})")
     output.append(f"Cloud Provider: {results['cloud_provider']}")
     return "\n".join(output)
+
+
+def format_diagnosis_report(groups, max_listed=5):
+    """Format `DiagnosisAggregator.report()` groups: one diagnosis per group of identical findings"""
+    output = [f"Diagnosis ({len(groups)} distinct findings):"]
+    for group in groups:
+        cloud = f", {group['cloud']}" if group["cloud"] else ""
+        output.append(f"\n[{group['count']}x] {group['service']} {group['status']}{cloud}")
+        listed = [f"{host}:{port}" for host, port in group["targets"][:max_listed]]
+        more = group["count"] - len(listed)
+        output.append(f"  Affected: {', '.join(listed)}" + (f" (+{more} more)" if more > 0 else ""))
+        output.append("  Possible Causes:")
+        output.extend(f"   - {cause}" for cause in group["possible_causes"])
+        output.append("  Suggested Fixes:")
+        output.extend(f"   - {fix}" for fix in group["suggested_fixes"])
+    return "\n".join(output)
@@ -53,3 +53,392 @@ def test_cli_execution():
     )
     assert result.returncode == 0
     assert "Host:" in result.stdout
+
+def test_diagnosis_aggregation_groups_hosts():
+    """Identical findings on different hosts share one diagnosis."""
+    from src.diagnosis_map import DiagnosisAggregator
+
+    agg = DiagnosisAggregator(max_targets=2)
+    for host in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        agg.add(host, 22, "closed", "AWS", {"ping_ok": True})
+    agg.add("10.0.0.1", 443, "open", "AWS", {"ping_ok": True})
+
+    report = agg.report()
+    assert len(report) == 2
+    assert report[0]["service"] == "SSH"
+    assert report[0]["count"] == 3
+    assert report[0]["targets"] == [("10.0.0.1", 22), ("10.0.0.2", 22)]
+
+def test_diagnosis_aggregation_of_scan_results():
+    """Results dicts and streamed ScanResults feed the same groups; exhaustion is skipped."""
+    import src.api as api
+    from src.diagnosis_map import DiagnosisAggregator
+
+    header = {"ip": "10.0.0.1", "is_private": True, "reachable": True, "cloud_provider": "Unknown"}
+    agg = DiagnosisAggregator()
+    agg.add_results(dict(header, host="a", ports={22: True, 80: False, 443: "Resource exhausted (EMFILE)"}))
+    agg.add_results(dict(header, host="b", ports={22: "Open (SSH)", 80: False}))
+
+    result = api.ScanResult(
+        host="c", ip="10.0.0.1", port=22, open=True, status="open", rtt_ms=0.1, service=None,
+        is_private=True, reachable=True, cloud_provider="Unknown",
+    )
+    assert agg.add_scan_result(result)["count"] == 3
+    assert agg.add_scan_result(result._replace(port=443, open=False, status="resource_exhausted")) is None
+
+    report = agg.report()
+    assert [(g["service"], g["status"], g["count"]) for g in report] == [("SSH", "open", 3), ("HTTP", "closed", 2)]
+    assert report[0]["targets"] == [("a", 22), ("b", 22), ("c", 22)]
+    assert report[0]["cloud"] is None
+
+    text = porthoundx.utils.format_diagnosis_report(report, max_listed=2)
+    assert "[3x] SSH open" in text
+    assert "Affected: a:22, b:22 (+1 more)" in text
+
+def test_columnar_export_roundtrip(tmp_path):
+    """Results flatten into typed columns that survive an .npz round trip."""
+    import numpy as np
+    from src import columnar
+
+    results = {
+        "host": "example.com",
+        "ip": "10.0.0.5",
+        "ports": {22: True, 80: False},
+        "rtt_ms": {22: 1.5, 80: 3.0},
+        "cloud_provider": "AWS",
+    }
+    cols = columnar.results_to_columns([results])
+    assert cols["port"].dtype == np.uint16
+    assert cols["status"].tolist() == [columnar.STATUS_OPEN, columnar.STATUS_CLOSED]
+
+    path = str(tmp_path / "scan.npz")
+    columnar.save(cols, path)
+    loaded = columnar.load(path)
+    assert loaded["ip_lo"].tolist() == [167772165, 167772165]
+    assert columnar.open_ports_by_subnet(loaded)["10.0.0.0/24"] == 1
+
+def test_status_changes_matches_aliases_per_host():
+    """Aliases sharing an IP give one change row each, not a cross join."""
+    from src import columnar
+
+    def scan(status):
+        return [
+            {"host": name, "ip": "10.0.0.5", "ports": {22: status, 80: False}, "cloud_provider": "Unknown"}
+            for name in ("a.example", "b.example", "c.example")
+        ]
+
+    changes = columnar.status_changes(columnar.results_to_columns(scan(True)), columnar.results_to_columns(scan(False)))
+    assert sorted(changes["host"]) == ["a.example", "b.example", "c.example"]
+    assert changes["port"].tolist() == [22, 22, 22]
+    assert (changes["status_before"] == columnar.STATUS_OPEN).all()
+    assert (changes["status_after"] == columnar.STATUS_CLOSED).all()
+
+def test_parquet_export_without_engine_names_pyarrow(tmp_path, monkeypatch):
+    """Without a Parquet engine, .parquet export fails with an install hint."""
+    from src import columnar
+
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setitem(sys.modules, "fastparquet", None)
+    cols = columnar.results_to_columns([{"host": "h", "ip": "10.0.0.5", "ports": {22: True}}])
+    with pytest.raises(ImportError, match="pip install pyarrow"):
+        columnar.save(cols, str(tmp_path / "scan.parquet"))
+
+def test_probe_plan_is_a_permutation():
+    """A randomized plan visits every (host, port) exactly once, priority ports first."""
+    from src.planner import ProbePlan
+
+    hosts = ["10.0.0.%d" % i for i in range(1, 8)]
+    ports = [22, 8081, 443, 9999, 80]
+    plan = ProbePlan(hosts, ports, seed=42, prioritize=True)
+    probes = list(plan)
+
+    assert len(probes) == len(plan) == len(hosts) * len(ports)
+    assert set(probes) == {(h, p) for h in hosts for p in ports}
+    assert {p for _, p in probes[:len(hosts) * 3]} == {22, 443, 80}
+    assert probes == list(ProbePlan(hosts, ports, seed=42, prioritize=True))
+    assert list(plan.iter_from(10)) == probes[10:]
+
+def test_probe_plan_handles_ipv6_subnets():
+    """A /64 is larger than sys.maxsize; sizes and probing must not go through len()."""
+    from src.planner import ProbePlan, TargetSet
+
+    targets = TargetSet(["2001:db8::/64", "10.0.0.1"])
+    assert targets.size == 2**64
+    assert "2001:db8::ffff:ffff:ffff:ffff" in targets
+
+    plan = ProbePlan(targets, [22, 443], seed=3)
+    assert plan.size == 2 * (2**64)
+    probes = [plan.probe(i) for i in range(64)]
+    assert len(set(probes)) == 64
+    assert all(port in (22, 443) for _, port in probes)
+    assert plan.probe(plan.size - 1)
+    assert next(plan.iter_from(plan.size - 1)) == plan.probe(plan.size - 1)
+
+def test_sweep_resumes_from_checkpoint(tmp_path, monkeypatch):
+    """An interrupted sweep flushes its progress and resumes without re-probing finished work."""
+    probed = []
+    interrupt_after = [5]
+
+    def fake_scan(ip, port, *args, **kwargs):
+        if len(probed) == interrupt_after[0]:
+            raise KeyboardInterrupt
+        probed.append((ip, port))
+        return port == 22, 0.1
+
+    monkeypatch.setattr(porthoundx.utils, "timed_scan", fake_scan)
+    monkeypatch.setattr(porthoundx.utils, "host_header", lambda host, dual_stack=False: {
+        "host": host, "ip": host, "is_private": True, "reachable": True,
+        "ports": {}, "rtt_ms": {}, "cloud_provider": "Unknown",
+    })
+
+    ckpt = str(tmp_path / "sweep.ckpt")
+    sweep = porthoundx.PortHoundXSweep(
+        ["10.0.0.0/29"], [22, 80], randomize=True, checkpoint=ckpt, checkpoint_interval=3600
+    )
+    with pytest.raises(KeyboardInterrupt):
+        sweep.collect()
+    first_pass = list(probed)
+
+    interrupt_after[0] = None
+    results = sweep.collect(resume=True)
+    resumed = probed[len(first_pass):]
+
+    assert len(first_pass) + len(resumed) == 12
+    assert not set(first_pass) & set(resumed)
+    assert len(results) == 6
+    assert all(r["ports"] == {22: True, 80: False} for r in results)
+
+def test_interrupt_while_journaling_is_not_counted_as_done(tmp_path, monkeypatch):
+    """A probe interrupted before it is journaled is re-probed on resume, not lost."""
+    ScanCheckpoint = porthoundx.ScanCheckpoint
+
+    monkeypatch.setattr(porthoundx.utils, "timed_scan", lambda ip, port, *args, **kwargs: (port == 22, 0.1))
+    monkeypatch.setattr(porthoundx.utils, "is_reachable", lambda ip: True)
+    record_probe = ScanCheckpoint.record_probe
+    calls = []
+
+    def interrupted_record(self, *args, **kwargs):
+        calls.append(args)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        record_probe(self, *args, **kwargs)
+
+    monkeypatch.setattr(ScanCheckpoint, "record_probe", interrupted_record)
+    ckpt = str(tmp_path / "sweep.ckpt")
+    sweep = porthoundx.PortHoundXSweep(["10.0.0.0/30"], [22, 80], checkpoint=ckpt, checkpoint_interval=3600)
+    with pytest.raises(KeyboardInterrupt):
+        sweep.collect()
+
+    results = sweep.collect(resume=True)
+    assert [r["ports"] for r in results] == [{22: True, 80: False}] * 2
+
+def test_dual_stack_race_reports_both_families(monkeypatch):
+    """With IPv6 refused, the IPv4 attempt wins and both families are reported."""
+    import src.utils as utils
+
+    with socket.socket(socket.AF_INET) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        monkeypatch.setattr(utils, "resolve_all", lambda host: {"ipv6": ["::1"], "ipv4": ["127.0.0.1"]})
+        race = utils.race_connect("dual.example", port, timeout=1.0, stagger=0.05)
+
+    assert race["open"] is True
+    assert race["family"] == "ipv4"
+    assert race["families"]["ipv6"] in ("closed", "error", "cancelled")
+    assert race["latency_ms"] is not None
+
+def test_dual_stack_resolves_each_host_once(monkeypatch):
+    """Dual-stack probes race the address set resolved with the host, not one lookup per port."""
+    lookups = []
+
+    def fake_resolve_all(host):
+        lookups.append(host)
+        return {"ipv6": [], "ipv4": ["127.0.0.1"]}
+
+    monkeypatch.setattr(porthoundx.utils, "resolve_all", fake_resolve_all)
+    monkeypatch.setattr(porthoundx.utils, "is_reachable", lambda ip: True)
+
+    sweep = porthoundx.PortHoundXSweep(["dual.example"], [1, 2, 3], dual_stack=True, dedupe=False)
+    results = sweep.collect()
+
+    assert lookups == ["dual.example"]
+    assert results[0]["addresses"] == {"ipv6": [], "ipv4": ["127.0.0.1"]}
+    assert all(race["families"]["ipv4"] == "closed" for race in results[0]["dual_stack"].values())
+
+def test_scan_many_yields_typed_results_and_cancels():
+    """scan_many streams ScanResults in-process and honours its cancel token."""
+    from src import api
+
+    with socket.socket(socket.AF_INET) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(16)
+        port = server.getsockname()[1]
+
+        seen = []
+        results = list(api.scan_many(["127.0.0.1"], [port], callback=seen.append))
+        assert seen == results
+        assert results[0].open is True and results[0].port == port
+
+        token = api.CancelToken()
+        count = 0
+        for _ in api.scan_many(["127.0.0.0/24"], [port], cancel=token):
+            count += 1
+            token.cancel()
+        assert count == 1
+
+def test_abortive_close_resets_open_probes():
+    """With abortive_close the probe leaves via RST (SO_LINGER 0), not a FIN handshake."""
+    import src.utils as utils
+
+    for abortive, expect_reset in ((True, True), (False, False)):
+        with socket.socket(socket.AF_INET) as server:
+            server.bind(("127.0.0.1", 0))
+            server.listen()
+            port = server.getsockname()[1]
+            assert utils.scan_port("127.0.0.1", port, abortive_close=abortive) is True
+            conn, _ = server.accept()
+            with conn:
+                conn.settimeout(1.0)
+                try:
+                    reset = conn.recv(1) != b""
+                except ConnectionResetError:
+                    reset = True
+            assert reset is expect_reset
+
+def test_source_pool_rotates_per_family_and_rejects_foreign_addresses():
+    """Sources are handed out round-robin within the target's family; unowned ones fail fast."""
+    import src.utils as utils
+
+    pool = utils.SourcePool(["127.0.0.1", "127.0.0.2"])
+    assert len(pool) == 2
+    assert [pool.pick("10.0.0.1") for _ in range(3)] == ["127.0.0.1", "127.0.0.2", "127.0.0.1"]
+    assert pool.pick("2001:db8::1") is None  # no IPv6 source configured
+    assert pool.pick("not-an-ip") is None
+
+    for bad in ("192.0.2.1", "not-an-ip"):
+        with pytest.raises(ValueError, match="Invalid source address"):
+            utils.SourcePool(["127.0.0.1", bad])
+
+def test_scan_many_retries_exhausted_probes(monkeypatch):
+    """Exhausted probes are retried `retries` times, then reported as resource_exhausted."""
+    import src.api as api
+
+    calls = []
+
+    def fake_probe(headers, host, port, *args):
+        calls.append(port)
+        recovered = port == 443 and calls.count(port) > 1
+        return api.ScanResult(
+            host=host, ip=host, port=port, open=recovered,
+            status="open" if recovered else "resource_exhausted",
+            rtt_ms=0.1 if recovered else None, service=None,
+            is_private=True, reachable=True, cloud_provider="Unknown",
+        )
+
+    monkeypatch.setattr(api, "_probe", fake_probe)
+    results = {r.port: r for r in api.scan_many(["10.0.0.1"], [22, 443], workers=4, retries=2, dedupe=False)}
+
+    assert calls.count(22) == 3  # first try + 2 retries
+    assert calls.count(443) == 2  # recovered on its first retry
+    assert results[22].status == "resource_exhausted" and results[22].open is False
+    assert results[443].status == "open"
+
+def test_dual_stack_exhaustion_is_not_reported_as_closed(monkeypatch):
+    """Exhaustion in a dual-stack race surfaces as a resource status, not a closed port."""
+    import errno
+    import src.api as api
+
+    utils = api.utils  # the module api.py probes through
+
+    class UnbindablePool:
+        # Binding a non-local source fails with EADDRNOTAVAIL, the same errno
+        # as a drained ephemeral port range.
+        def pick(self, ip):
+            return "2001:db8::1" if ":" in ip else "192.0.2.1"
+
+    monkeypatch.setattr(utils, "resolve_all", lambda host: {"ipv6": ["::1"], "ipv4": ["127.0.0.1"]})
+    status, rtt, race = utils.probe_port("dual.example", "127.0.0.1", 22, dual_stack=True, sources=UnbindablePool())
+    assert status == "Resource exhausted (dual-stack race)"
+    assert rtt is None
+    assert race["families"]["ipv4"] == "resource_exhausted"
+
+    def no_fds(*args, **kwargs):
+        raise utils.ResourceExhausted(errno.EMFILE, "Too many open files")
+
+    monkeypatch.setattr(utils, "race_connect", no_fds)
+    status, rtt, race = utils.probe_port("dual.example", "127.0.0.1", 22, dual_stack=True)
+    assert status == "Resource exhausted (EMFILE)"
+    assert race is None
+
+    monkeypatch.setattr(utils, "is_reachable", lambda ip: True)
+    results = list(api.scan_many(["127.0.0.1"], [22], dual_stack=True, retries=0, dedupe=False))
+    assert [r.status for r in results] == ["resource_exhausted"]
+
+def test_sweep_probes_shared_address_once(monkeypatch):
+    """Hostnames behind one address are probed once and fanned back out."""
+    probed = []
+
+    def fake_scan(ip, port, *args, **kwargs):
+        probed.append((ip, port))
+        return True, 0.1
+
+    addresses = {"a.example": "203.0.113.5", "b.example": "203.0.113.5", "c.example": "203.0.113.9"}
+    monkeypatch.setattr(porthoundx.utils, "resolve_host", lambda host: addresses.get(host, host))
+    monkeypatch.setattr(porthoundx.utils, "timed_scan", fake_scan)
+    monkeypatch.setattr(porthoundx.utils, "is_reachable", lambda ip: True)
+
+    sweep = porthoundx.PortHoundXSweep(["a.example", "b.example", "c.example"], [22, 443])
+    results = sweep.collect()
+
+    assert sorted(probed) == [("203.0.113.5", 22), ("203.0.113.5", 443), ("203.0.113.9", 22), ("203.0.113.9", 443)]
+    assert [r["host"] for r in results] == ["a.example", "b.example", "c.example"]
+    assert results[0]["aliases"] == ["b.example"]
+    assert results[1]["aliases"] == ["a.example"]
+    assert "aliases" not in results[2]
+
+    text = porthoundx.utils.format_human_readable(results[0])
+    assert "Aliases: b.example (same probe)" in text
+    assert [g["count"] for g in porthoundx.PortHoundXSweep.diagnose(results)] == [3, 3]  # SSH, HTTPS
+    assert "Aliases" not in porthoundx.utils.format_human_readable(results[2])
+
+def test_names_on_unwalked_cidr_addresses_are_still_probed(monkeypatch):
+    """A name resolving to a block's network/broadcast address is probed, not dropped as covered."""
+    import src.api as api
+
+    probed = []
+
+    def fake_scan(ip, port, *args, **kwargs):
+        probed.append(ip)
+        return True, 0.1
+
+    addresses = {"net.example": "10.0.0.0", "bc.example": "10.0.0.3", "ok.example": "10.0.0.1"}
+    monkeypatch.setattr(porthoundx.utils, "resolve_host", lambda host: addresses.get(host, host))
+    monkeypatch.setattr(porthoundx.utils, "timed_scan", fake_scan)
+    monkeypatch.setattr(porthoundx.utils, "is_reachable", lambda ip: True)
+    targets = ["10.0.0.0/30", "net.example", "bc.example", "ok.example"]
+
+    results = porthoundx.PortHoundXSweep(targets, [22]).collect()
+    assert [r["host"] for r in results] == ["10.0.0.1", "10.0.0.2", "net.example", "bc.example", "ok.example"]
+    assert sorted(probed) == ["10.0.0.0", "10.0.0.1", "10.0.0.2", "10.0.0.3"]
+
+    hosts = {r.host for r in api.scan_many(targets, [22])}
+    assert hosts == {"10.0.0.1", "10.0.0.2", "net.example", "bc.example", "ok.example"}
+
+def test_dual_stack_sweep_checkpoints_resource_exhaustion(tmp_path, monkeypatch):
+    """A dual-stack race that cannot even get a selector is checkpointed, not a crash."""
+    import errno
+
+    def no_fds(*args, **kwargs):
+        raise porthoundx.utils.ResourceExhausted(errno.EMFILE, "Too many open files")
+
+    monkeypatch.setattr(porthoundx.utils, "race_connect", no_fds)
+    monkeypatch.setattr(porthoundx.utils, "is_reachable", lambda ip: True)
+
+    ckpt = str(tmp_path / "sweep.ckpt")
+    sweep = porthoundx.PortHoundXSweep(["127.0.0.1"], [22], dual_stack=True, checkpoint=ckpt)
+    results = sweep.collect()
+    assert results[0]["ports"][22] == "Resource exhausted (EMFILE)"
+
+    resumed = sweep.collect(resume=True)
+    assert resumed[0]["ports"][22] == "Resource exhausted (EMFILE)"